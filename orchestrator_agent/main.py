@@ -1,6 +1,10 @@
 import os
 import json
-from fastapi import FastAPI, UploadFile, Form
+import asyncio
+import uuid
+import pyarrow as pa
+from typing import Optional
+from fastapi import FastAPI, UploadFile, Form, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
 from google.cloud import storage
 from datetime import datetime
@@ -8,6 +12,12 @@ from google.genai.types import Content, Part
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from agent import orchestrator_agent
+from sub_agent.doc_parsing_agent.tools import resubmit_docs, stream_and_parse_docs, close_docai_client
+from sub_agent.rules_agent.tools import loan_approval
+from sub_agent.storage_agent.tools import save_to_bigquery
+from sub_agent.storage_agent.archive import decision_archive
+from sub_agent.shared.application_store import application_store, ApplicationNotFoundError
+from sub_agent.shared.logger import get_logger
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,10 +26,12 @@ BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 PROJECT_ID = os.getenv("PROJECT_ID")
 LOCATION = os.getenv("PROCESSOR_LOCATION")
 PROCESSOR_ID = os.getenv("PROCESSOR_ID")
+ARCHIVE_COMPACT_INTERVAL = int(os.getenv("ARCHIVE_COMPACT_INTERVAL", "3600"))
+
+logger = get_logger("main")
 
 APP_NAME = "loan_underwriting_app"
 USER_ID = "user_123"
-SESSION_ID = "session_123"
 
 app = FastAPI()
 app.add_middleware(
@@ -30,6 +42,27 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# ---------------------------
+# Decision archive compaction
+# ---------------------------
+async def compact_archive_periodically():
+    while True:
+        await asyncio.sleep(ARCHIVE_COMPACT_INTERVAL)
+        try:
+            await asyncio.to_thread(decision_archive.compact)
+        except Exception:
+            logger.exception("Decision archive compaction failed")
+
+@app.on_event("startup")
+async def start_archive_compaction():
+    # Keep a reference so the task is not garbage-collected
+    app.state.archive_compaction_task = asyncio.create_task(compact_archive_periodically())
+
+@app.on_event("shutdown")
+async def close_clients():
+    app.state.archive_compaction_task.cancel()
+    await close_docai_client()
+
 # ---------------------------
 # Upload PDF to GCS
 # ---------------------------
@@ -40,6 +73,42 @@ def upload_to_gcs(bucket_name: str, blob_name: str, file: UploadFile) -> str:
     blob.upload_from_file(file.file, rewind=True)
     return f"gs://{bucket_name}/{blob_name}"
 
+# ---------------------------
+# Approval stages
+# ---------------------------
+def build_stages():
+    now = datetime.now()
+    return [
+        {
+            "stage": "Approval Initiated",
+            "completed": True,
+            "approver": "System",
+            "date": now.strftime("%Y-%m-%d"),
+            "time": now.strftime("%H:%M:%S"),
+        },
+        {
+            "stage": "Process",
+            "completed": True,
+            "approver": None,
+            "date": None,
+            "time": None,
+        },
+        {
+            "stage": "Qualify",
+            "completed": True,
+            "approver": None,
+            "date": None,
+            "time": None,
+        },
+        {
+            "stage": "Final Step",
+            "completed": True,
+            "approver": None,
+            "date": None,
+            "time": None,
+        },
+    ]
+
 # ---------------------------
 # ADK runner
 # ---------------------------
@@ -55,6 +124,8 @@ async def underwrite(
     id_proof_pdf: UploadFile,
     declared_amount: int = Form(...)
 ):
+    application_id = uuid.uuid4().hex
+
     # Upload all PDFs to GCS
     app_gcs = upload_to_gcs(BUCKET_NAME, application_pdf.filename, application_pdf)
     bank_gcs = upload_to_gcs(BUCKET_NAME, bank_statement_pdf.filename, bank_statement_pdf)
@@ -85,50 +156,139 @@ async def underwrite(
         }))]
     )
 
+    # One session per application; the id reaches the parsing tool through
+    # session state rather than through the model-generated tool arguments
     await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
+        app_name=APP_NAME, user_id=USER_ID, session_id=application_id,
+        state={"application_id": application_id}
     )
 
     final_decision = None
-    async for event in runner.run_async(
-        user_id=USER_ID, session_id=SESSION_ID, new_message=user_content
-    ):
-        if hasattr(event, "content") and event.content:
-            for part in event.content.parts:
-                final_decision = part.text
-    now = datetime.now()
-    stages = [
-        {
-            "stage": "Approval Initiated",
-            "completed": True,
-            "approver": "System",
-            "date": now.strftime("%Y-%m-%d"),
-            "time": now.strftime("%H:%M:%S"),
-        },
-        {
-            "stage": "Process",
-            "completed": True,
-            "approver": None,
-            "date": None,
-            "time": None,
-        },
-        {
-            "stage": "Qualify",
-            "completed": True,
-            "approver": None,
-            "date": None,
-            "time": None,
-        },
-        {
-            "stage": "Final Step",
-            "completed": True,
-            "approver": None,
-            "date": None,
-            "time": None,
-        },
-    ]
+    try:
+        async for event in runner.run_async(
+            user_id=USER_ID, session_id=application_id, new_message=user_content
+        ):
+            if hasattr(event, "content") and event.content:
+                for part in event.content.parts:
+                    final_decision = part.text
+    finally:
+        # Per-document results are already in application_store; drop the event history
+        await session_service.delete_session(
+            app_name=APP_NAME, user_id=USER_ID, session_id=application_id
+        )
+    stages = build_stages()
     print("final_decision",final_decision)
     # return json.dumps({"decision": final_decision,
     # "stages": stages})
-    return {"decision": final_decision,
-    "stages": stages}
\ No newline at end of file
+    return {"application_id": application_id,
+    "decision": final_decision,
+    "stages": stages}
+
+
+@app.post("/underwrite/stream")
+async def underwrite_stream(
+    application_pdf: UploadFile,
+    bank_statement_pdf: UploadFile,
+    pay_stub_pdf: UploadFile,
+    tax_return_pdf: UploadFile,
+    id_proof_pdf: UploadFile,
+    declared_amount: int = Form(...)
+):
+    # Parses documents as DocAI results arrive and stops early once the outcome
+    # is fixed, then applies the rules without the agent pipeline
+    application_id = uuid.uuid4().hex
+
+    record = await stream_and_parse_docs({
+        "application_id": application_id,
+        "application_gcs_uri": upload_to_gcs(BUCKET_NAME, application_pdf.filename, application_pdf),
+        "bank_statement_gcs_uri": upload_to_gcs(BUCKET_NAME, bank_statement_pdf.filename, bank_statement_pdf),
+        "pay_stub_gcs_uri": upload_to_gcs(BUCKET_NAME, pay_stub_pdf.filename, pay_stub_pdf),
+        "tax_return_gcs_uri": upload_to_gcs(BUCKET_NAME, tax_return_pdf.filename, tax_return_pdf),
+        "id_proof_gcs_uri": upload_to_gcs(BUCKET_NAME, id_proof_pdf.filename, id_proof_pdf),
+        "declared_amount": declared_amount,
+        "project_id": PROJECT_ID,
+        "location": LOCATION,
+        "processor_id": PROCESSOR_ID,
+    })
+
+    if record.get("document_mismatch"):
+        final_decision = record["message"]
+    else:
+        final_decision = loan_approval(record)
+        await save_to_bigquery({**record, "decision": final_decision})
+
+    logger.info(f"Application {application_id} decision: {final_decision}")
+    return {"application_id": application_id,
+    "decision": final_decision,
+    "stages": build_stages()}
+
+
+@app.post("/underwrite/{application_id}/resubmit")
+async def resubmit(
+    application_id: str,
+    application_pdf: Optional[UploadFile] = None,
+    bank_statement_pdf: Optional[UploadFile] = None,
+    pay_stub_pdf: Optional[UploadFile] = None,
+    tax_return_pdf: Optional[UploadFile] = None,
+    id_proof_pdf: Optional[UploadFile] = None,
+):
+    try:
+        application_store.get(application_id)
+    except ApplicationNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown application: {application_id}")
+
+    # Upload only the replaced PDFs; stored results are reused for the rest
+    uploads = {
+        "application_gcs_uri": application_pdf,
+        "bank_statement_gcs_uri": bank_statement_pdf,
+        "pay_stub_gcs_uri": pay_stub_pdf,
+        "tax_return_gcs_uri": tax_return_pdf,
+        "id_proof_gcs_uri": id_proof_pdf,
+    }
+    changed_uris = {
+        uri_key: upload_to_gcs(BUCKET_NAME, file.filename, file)
+        for uri_key, file in uploads.items() if file is not None
+    }
+    if not changed_uris:
+        raise HTTPException(status_code=400, detail="No replacement documents provided")
+
+    try:
+        record = await resubmit_docs({
+            "application_id": application_id,
+            **changed_uris,
+            "project_id": PROJECT_ID,
+            "location": LOCATION,
+            "processor_id": PROCESSOR_ID,
+        })
+    except ApplicationNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown application: {application_id}")
+
+    if record.get("document_mismatch"):
+        final_decision = record["message"]
+    else:
+        final_decision = loan_approval(record)
+        await save_to_bigquery({**record, "decision": final_decision})
+
+    logger.info(f"Application {application_id} decision: {final_decision}")
+    return {"application_id": application_id,
+    "decision": final_decision,
+    "stages": build_stages()}
+
+
+@app.post("/archive/query")
+async def query_archive(query: dict = Body(...)):
+    # e.g. {"filters": [["credit_score", ">=", 700]], "group_by": ["decision"],
+    #       "aggregates": [["dti", "mean"], ["decision", "count"]]}
+    try:
+        table = await asyncio.to_thread(
+            decision_archive.query,
+            columns=query.get("columns"),
+            filters=query.get("filters"),
+            group_by=query.get("group_by"),
+            aggregates=query.get("aggregates"),
+            start_date=query.get("start_date"),
+            end_date=query.get("end_date"),
+        )
+    except (ValueError, pa.ArrowException) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"rows": table.to_pylist()}
\ No newline at end of file
@@ -55,6 +55,7 @@ Steps:
      "monthly_income": <float or null>,
      "monthly_debt": <float or null>,
      "dti": <float or null>,
+     "bank_income": <float or null>,
      "net_pay": <float or null>,
      "tax_income": <float or null>,
      "id_name": <string>,
@@ -1,60 +1,145 @@
 import asyncio
 import logging
+import weakref
 from google.cloud import documentai_v1 as documentai
+from google.adk.tools import ToolContext
 from ..shared.utils import extract_fields, safe_float, clean_int, safe_int
 from ..shared.logger import get_logger
+from ..shared.application_store import application_store
+from ..rules_agent.tools import application_decision
 
 logger = get_logger("doc_parsing_agent")
 
 # ---------------------------
 # DocAI Processing
 # ---------------------------
+# One async client (and gRPC channel) per event loop
+_docai_clients = weakref.WeakKeyDictionary()
+
+
+def get_docai_client():
+    loop = asyncio.get_running_loop()
+    client = _docai_clients.get(loop)
+    if client is None:
+        client = documentai.DocumentProcessorServiceAsyncClient()
+        _docai_clients[loop] = client
+    return client
+
+
+async def close_docai_client():
+    client = _docai_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.transport.close()
+
+
 async def process_single_doc(project_id, location, processor_id, gcs_uri):
     logger.info(f"Starting document processing: {gcs_uri}")
-    
-    def blocking_task():
-        try:
-            client = documentai.DocumentProcessorServiceClient()
-            name = client.processor_path(project_id, location, processor_id)
-            logger.debug(f"Processor path: {name}")
-
-            request = documentai.ProcessRequest(
-                name=name,
-                gcs_document=documentai.GcsDocument(
-                    gcs_uri=gcs_uri,
-                    mime_type="application/pdf"
-                )
-            )
-            result = client.process_document(request=request)
-            logger.info(f"Document processed successfully: {gcs_uri}")
-            return documentai.Document.to_dict(result.document)
-        except Exception as e:
-            logger.exception(f"Failed to process document: {gcs_uri}")
-            return {"error": str(e)}
 
-    return await asyncio.to_thread(blocking_task)
+    # The async client lets a cancelled task abort the in-flight DocAI request
+    try:
+        client = get_docai_client()
+        name = client.processor_path(project_id, location, processor_id)
+        logger.debug(f"Processor path: {name}")
+
+        request = documentai.ProcessRequest(
+            name=name,
+            gcs_document=documentai.GcsDocument(
+                gcs_uri=gcs_uri,
+                mime_type="application/pdf"
+            )
+        )
+        result = await client.process_document(request=request)
+        logger.info(f"Document processed successfully: {gcs_uri}")
+        return documentai.Document.to_dict(result.document)
+    except Exception as e:
+        logger.exception(f"Failed to process document: {gcs_uri}")
+        return {"error": str(e)}
 
 
 # ---------------------------
-# Orchestration Layer
+# Document registry
 # ---------------------------
-async def process_and_parse_docs(payload: dict):
-    logger.info("Starting process_and_parse_docs")
-    logger.debug(f"Payload received: {payload}")
+# Payload key carrying each document's GCS URI
+DOC_URI_KEYS = {
+    "application": "application_gcs_uri",
+    "bank": "bank_statement_gcs_uri",
+    "pay_stub": "pay_stub_gcs_uri",
+    "tax": "tax_return_gcs_uri",
+    "id": "id_proof_gcs_uri",
+}
+
+DOC_LABELS = {
+    "application": "Application form",
+    "bank": "Bank statement",
+    "pay_stub": "Pay stub",
+    "tax": "Tax return",
+    "id": "ID proof",
+}
+
+# Fields produced by each document's parser, in return order
+DOC_FIELDS = {
+    "application": ("credit", "loan", "months", "annual", "documents", "applicant_name"),
+    "bank": ("monthly_income", "monthly_debt", "dti"),
+    "pay_stub": ("net_pay",),
+    "tax": ("tax_income",),
+    "id": ("id_name", "id_number", "dob"),
+}
+
+
+def parse_document(doc_key: str, doc_json: dict):
+    """Parse a single processed document into its named fields.
+
+    Returns None if the document could not be parsed.
+    """
+    try:
+        values = DOC_PARSERS[doc_key](doc_json or {})
+    except Exception as e:
+        logger.warning(f"{DOC_LABELS[doc_key]} parsing failed or mismatched: {e}")
+        return None
 
-    project_id = payload.get("project_id")
-    location = payload.get("location")
-    processor_id = payload.get("processor_id")
+    fields = DOC_FIELDS[doc_key]
+    if len(fields) == 1:
+        values = (values,)
+    return dict(zip(fields, values))
 
-    gcs_uris = {
-        "application": payload.get("application_gcs_uri"),
-        "bank": payload.get("bank_statement_gcs_uri"),
-        "pay_stub": payload.get("pay_stub_gcs_uri"),
-        "tax": payload.get("tax_return_gcs_uri"),
-        "id": payload.get("id_proof_gcs_uri"),
-    }
 
-    logger.info("Submitting documents for processing")
+def merge_parsed_docs(parsed_docs: dict) -> dict:
+    """Build the underwriting record from per-document parse results."""
+    record = {field: None for fields in DOC_FIELDS.values() for field in fields}
+    record["documents"] = {}
+    document_mismatch = False
+
+    for doc_key in DOC_FIELDS:
+        parsed = parsed_docs.get(doc_key)
+        if parsed is None:
+            document_mismatch = True
+            continue
+        record.update(parsed)
+
+    logger.info(
+        f"Parsed applicant: {record['applicant_name']}, credit={record['credit']}, "
+        f"loan={record['loan']}, months={record['months']}, dti={record['dti']}"
+    )
+
+    # An outcome fixed by the application form stands even if other documents failed
+    application = parsed_docs.get("application")
+    form_decided = application is not None and application_decision(application) is not None
+
+    # If everything failed, mark as mismatched
+    nothing_parsed = not any(record[k] for k in ["credit", "loan", "dti", "net_pay", "tax_income"])
+    if not form_decided and (document_mismatch or nothing_parsed):
+        logger.warning("Uploaded documents appear mismatched or invalid for underwriting pipeline.")
+        return {"document_mismatch": True, "message": "Document mismatched or unrecognized document type"}
+
+    # Rules compare the pay stub against the bank statement salary deposit
+    record["bank_income"] = record["monthly_income"]
+    record["document_mismatch"] = False
+    return record
+
+
+async def process_docs(project_id, location, processor_id, gcs_uris: dict) -> dict:
+    """Run DocAI on the given documents concurrently and parse each result."""
+    logger.info(f"Submitting documents for processing: {list(gcs_uris)}")
     tasks = {key: process_single_doc(project_id, location, processor_id, uri)
              for key, uri in gcs_uris.items() if uri}
 
@@ -62,69 +147,125 @@ async def process_and_parse_docs(payload: dict):
     docs_json = dict(zip(tasks.keys(), results))
 
     logger.debug("Documents processed. Parsing fields now...")
+    return {key: parse_document(key, doc_json) for key, doc_json in docs_json.items()}
 
-    # Initialize placeholders for outputs
-    credit = loan = months = annual = dti = net_pay = tax_income = None
-    monthly_income = monthly_debt = None
-    id_name = id_number = dob = applicant_name = None
-    documents = {}
-    document_mismatch = False
 
-    # Parse each document with safe wrappers
-    try:
-        credit, loan, months, annual, documents, applicant_name = parse_application_form(docs_json.get("application", {}))
-    except Exception as e:
-        logger.warning(f"Application form parsing failed or mismatched: {e}")
-        document_mismatch = True
+# ---------------------------
+# Orchestration Layer
+# ---------------------------
+async def process_and_parse_docs(payload: dict, tool_context: ToolContext = None):
+    logger.info("Starting process_and_parse_docs")
+    logger.debug(f"Payload received: {payload}")
 
-    try:
-        monthly_income, monthly_debt, dti = parse_bank_statement(docs_json.get("bank", {}))
-    except Exception as e:
-        logger.warning(f"Bank statement parsing failed or mismatched: {e}")
-        document_mismatch = True
+    gcs_uris = {key: payload.get(uri_key) for key, uri_key in DOC_URI_KEYS.items()}
+    parsed_docs = await process_docs(
+        payload.get("project_id"),
+        payload.get("location"),
+        payload.get("processor_id"),
+        gcs_uris,
+    )
+
+    # Keep per-document results so a later re-submit only re-processes replaced documents.
+    # Under the agent the id comes from session state set by main.py, never from model output.
+    if tool_context is not None:
+        application_id = tool_context.state.get("application_id")
+    else:
+        application_id = payload.get("application_id")
+    if application_id:
+        application_store.save(application_id, gcs_uris, parsed_docs)
+
+    return merge_parsed_docs(parsed_docs)
+
+
+async def resubmit_docs(payload: dict):
+    """
+    Re-underwrite a stored application after some documents were replaced.
+
+    Only documents whose GCS URI is present in the payload are sent to DocAI;
+    the stored parse results are reused for every other document.
+    Raises ApplicationNotFoundError if the application is unknown or expired.
+    """
+    application_id = payload.get("application_id")
+    logger.info(f"Starting resubmit_docs for application {application_id}")
+
+    stored = application_store.get(application_id)
+
+    changed_uris = {key: payload.get(uri_key) for key, uri_key in DOC_URI_KEYS.items()
+                    if payload.get(uri_key)}
+    # Documents cancelled by an early exit have no stored result yet
+    for key, uri in stored["gcs_uris"].items():
+        if uri and key not in stored["parsed_docs"]:
+            changed_uris.setdefault(key, uri)
+    logger.info(f"Re-processing changed documents: {list(changed_uris)}")
+
+    reparsed = await process_docs(
+        payload.get("project_id"),
+        payload.get("location"),
+        payload.get("processor_id"),
+        changed_uris,
+    )
+
+    gcs_uris = {**stored["gcs_uris"], **changed_uris}
+    parsed_docs = {**stored["parsed_docs"], **reparsed}
+    application_store.save(application_id, gcs_uris, parsed_docs)
+
+    return merge_parsed_docs(parsed_docs)
+
+
+async def process_and_parse_single_doc(doc_key, project_id, location, processor_id, gcs_uri):
+    doc_json = await process_single_doc(project_id, location, processor_id, gcs_uri)
+    return doc_key, parse_document(doc_key, doc_json)
+
+
+async def stream_and_parse_docs(payload: dict):
+    """
+    Streaming variant of process_and_parse_docs.
+
+    Each document is parsed as soon as its DocAI result arrives. Once the
+    outcome is fixed - the application form decides it alone (see
+    application_decision) or a document fails to parse - the outstanding
+    DocAI calls are cancelled. The merged record is returned exactly as
+    process_and_parse_docs would return it for the documents parsed so far,
+    so loan_approval reaches the same decision on either path.
+    """
+    logger.info("Starting stream_and_parse_docs")
+    logger.debug(f"Payload received: {payload}")
 
-    try:
-        net_pay = parse_pay_stub(docs_json.get("pay_stub", {}))
-    except Exception as e:
-        logger.warning(f"Pay stub parsing failed or mismatched: {e}")
-        document_mismatch = True
+    gcs_uris = {key: payload.get(uri_key) for key, uri_key in DOC_URI_KEYS.items()}
+    missing = [key for key, uri in gcs_uris.items() if not uri]
+    if missing:
+        logger.warning(f"Missing documents, skipping processing: {missing}")
+        return merge_parsed_docs({})
 
-    try:
-        tax_income = parse_tax_return(docs_json.get("tax", {}))
-    except Exception as e:
-        logger.warning(f"Tax return parsing failed or mismatched: {e}")
-        document_mismatch = True
+    tasks = [
+        asyncio.create_task(process_and_parse_single_doc(
+            key, payload.get("project_id"), payload.get("location"), payload.get("processor_id"), uri
+        ))
+        for key, uri in gcs_uris.items()
+    ]
 
+    parsed_docs = {}
     try:
-        id_name, id_number, dob = parse_id_proof(docs_json.get("id", {}))
-    except Exception as e:
-        logger.warning(f"ID proof parsing failed or mismatched: {e}")
-        document_mismatch = True
+        for next_doc in asyncio.as_completed(tasks):
+            doc_key, parsed = await next_doc
+            parsed_docs[doc_key] = parsed
+            if parsed is None or (doc_key == "application" and application_decision(parsed)):
+                break
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
-    logger.info(f"Parsed applicant: {applicant_name}, credit={credit}, loan={loan}, months={months}, dti={dti}")
+    if pending:
+        logger.info(f"Outcome fixed by {DOC_LABELS[doc_key].lower()}; cancelled {len(pending)} DocAI call(s)")
 
-    # If everything failed, mark as mismatched
-    if document_mismatch or not any([credit, loan, dti, net_pay, tax_income]):
-        logger.warning("Uploaded documents appear mismatched or invalid for underwriting pipeline.")
-        return {"document_mismatch": True, "message": "Document mismatched or unrecognized document type"}
+    # Cancelled documents are left out so a re-submit processes them
+    application_id = payload.get("application_id")
+    if application_id:
+        application_store.save(application_id, gcs_uris, parsed_docs)
 
-    return {
-        "credit": credit,
-        "loan": loan,
-        "months": months,
-        "annual": annual,
-        "documents": documents,
-        "applicant_name": applicant_name,
-        "monthly_income": monthly_income,
-        "monthly_debt": monthly_debt,
-        "dti": dti,
-        "net_pay": net_pay,
-        "tax_income": tax_income,
-        "id_name": id_name,
-        "id_number": id_number,
-        "dob": dob,
-        "document_mismatch": False,
-    }
+    return merge_parsed_docs(parsed_docs)
 
 
 # ---------------------------
@@ -200,3 +341,12 @@ def parse_id_proof(doc_json: dict):
     dob = fields.get("Date_of_birth")
     logger.info(f"ID proof parsed: id_name={id_name}, id_number={id_number}, dob={dob}")
     return id_name, id_number, dob
+
+
+DOC_PARSERS = {
+    "application": parse_application_form,
+    "bank": parse_bank_statement,
+    "pay_stub": parse_pay_stub,
+    "tax": parse_tax_return,
+    "id": parse_id_proof,
+}
@@ -2,10 +2,32 @@ from ..shared.logger import get_logger
 
 logger = get_logger("rules_agent")
 
+def application_decision(payload: dict):
+    """
+    Return the outcome decided by the application form alone, else None.
+
+    These outcomes take precedence over every other rule, including the
+    cross-document checks, so they can be decided before the other documents
+    are processed. A form with none of the required fields is left to the
+    mismatch checks.
+    """
+    required = [payload.get("credit"), payload.get("loan"), payload.get("months"), payload.get("annual")]
+    if all(value is None for value in required):
+        return None
+    if None in required:
+        return "Error: Missing required data"
+    if payload.get("credit") < 580:
+        return "Denied: Credit too low"
+    return None
+
 def loan_approval(payload: dict) -> str:
     logger.info("Evaluating loan approval rules")
 
     try:
+        decision = application_decision(payload)
+        if decision:
+            return decision
+
         credit = payload.get("credit")
         loan = payload.get("loan")
         months = payload.get("months")
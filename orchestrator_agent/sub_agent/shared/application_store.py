@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+APPLICATION_STORE_MAX_SIZE = int(os.getenv("APPLICATION_STORE_MAX_SIZE", "1000"))
+APPLICATION_STORE_TTL = int(os.getenv("APPLICATION_STORE_TTL", "86400"))
+
+
+class ApplicationNotFoundError(Exception):
+    """Raised when an application id is unknown or has expired from the store."""
+
+
+class ApplicationStore:
+    """
+    In-memory store of per-document parse results, keyed by application id.
+
+    Entries expire after `ttl` seconds and the least recently saved entries are
+    evicted beyond `max_size`. The store is local to one process: with several
+    uvicorn workers, or after a restart, a re-submit can only find applications
+    underwritten by the same worker process.
+    """
+
+    def __init__(self, max_size: int = APPLICATION_STORE_MAX_SIZE, ttl: int = APPLICATION_STORE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._applications = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, application_id: str, gcs_uris: dict, parsed_docs: dict):
+        with self._lock:
+            self._evict_expired()
+            self._applications.pop(application_id, None)
+            self._applications[application_id] = {
+                "gcs_uris": dict(gcs_uris),
+                "parsed_docs": dict(parsed_docs),
+                "updated_at": datetime.utcnow().isoformat(),
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            while len(self._applications) > self.max_size:
+                self._applications.popitem(last=False)
+
+    def get(self, application_id: str):
+        """Return the stored entry, or raise ApplicationNotFoundError."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._applications.get(application_id)
+        if entry is None:
+            raise ApplicationNotFoundError(f"Unknown application: {application_id}")
+        return entry
+
+    def _evict_expired(self):
+        # Entries are ordered by save time, so expired ones are at the front
+        now = time.monotonic()
+        while self._applications:
+            oldest_id, oldest = next(iter(self._applications.items()))
+            if oldest["expires_at"] > now:
+                break
+            del self._applications[oldest_id]
+
+
+application_store = ApplicationStore()
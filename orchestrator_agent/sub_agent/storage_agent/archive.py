@@ -0,0 +1,248 @@
+import fcntl
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from ..shared.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("decision_archive")
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "decision_archive")
+
+# Analytics columns of the BigQuery decision table. Applicant PII
+# (name, ID number, date of birth) is deliberately not archived.
+SCHEMA = pa.schema([
+    ("credit_score", pa.int64()),
+    ("loan_amount", pa.float64()),
+    ("term_months", pa.int64()),
+    ("annual_income", pa.float64()),
+    ("monthly_income", pa.float64()),
+    ("monthly_debt", pa.float64()),
+    ("dti", pa.float64()),
+    ("net_pay", pa.float64()),
+    ("tax_income", pa.float64()),
+    ("decision", pa.string()),
+    ("timestamp", pa.string()),
+])
+
+FILTER_OPS = {
+    "==": pc.equal,
+    "!=": pc.not_equal,
+    "<": pc.less,
+    "<=": pc.less_equal,
+    ">": pc.greater,
+    ">=": pc.greater_equal,
+    "in": lambda column, values: pc.is_in(column, value_set=pa.array(values)),
+}
+
+AGGREGATES = {"count", "count_distinct", "sum", "mean", "min", "max"}
+NUMERIC_AGGREGATES = {"sum", "mean"}
+
+
+def _part_name() -> str:
+    """Time-ordered part file name, so sorting by name keeps append order."""
+    return f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+def _coerce(value, field_type):
+    """Convert value to the column type, or None if it cannot be converted."""
+    if value is None or value == "":
+        return None
+    try:
+        if pa.types.is_integer(field_type):
+            return int(float(value))
+        if pa.types.is_floating(field_type):
+            return float(value)
+        return str(value)
+    except Exception:
+        return None
+
+
+def _as_list(value, name: str) -> list:
+    if value is None:
+        return []
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"{name} must be a list")
+    return list(value)
+
+
+def _as_date(value, name: str):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+
+class DecisionArchive:
+    """
+    Local append-only Parquet archive of decision rows, partitioned by date.
+
+    Each append writes a new part file under <root>/date=YYYY-MM-DD/;
+    compact() merges a partition's parts into a single file.
+    Queries read only the requested columns and date partitions, memory-mapped.
+    Each partition has its own file lock (POSIX flock on <partition>/.lock),
+    held shared by queries and exclusive by appends and compaction. This keeps
+    several worker processes consistent as long as they share a local
+    filesystem, and compacting one day never blocks another.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+
+    @contextmanager
+    def _partition_lock(self, date: str, exclusive: bool = True):
+        partition_dir = os.path.join(self.root, f"date={date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        with open(os.path.join(partition_dir, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def append(self, rows: list):
+        by_date = {}
+        for row in rows:
+            record = {field.name: _coerce(row.get(field.name), field.type) for field in SCHEMA}
+            date = (record["timestamp"] or datetime.utcnow().isoformat())[:10]
+            by_date.setdefault(date, []).append(record)
+
+        for date, records in by_date.items():
+            table = pa.Table.from_pylist(records, schema=SCHEMA)
+            with self._partition_lock(date):
+                self._write(date, table, _part_name())
+        logger.info(f"Archived {len(rows)} decision row(s)")
+
+    def compact(self, date: str = None):
+        """Merge the part files of one partition (or every partition) into one file."""
+        dates = [date] if date else self.partitions()
+        for partition in dates:
+            with self._partition_lock(partition):
+                parts = self._part_files(partition)
+                if len(parts) < 2:
+                    continue
+                table = pa.concat_tables([pq.read_table(path, columns=SCHEMA.names, memory_map=True)
+                                          for path in parts])
+                self._write(partition, table, _part_name())
+                for path in parts:
+                    os.remove(path)
+            logger.info(f"Compacted {len(parts)} files in partition {partition}")
+
+    def _write(self, date: str, table, filename: str):
+        partition_dir = os.path.join(self.root, f"date={date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        # Write under a hidden name first so readers never see a partial file
+        tmp_path = os.path.join(partition_dir, f".{filename}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(partition_dir, filename))
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def partitions(self, start_date: str = None, end_date: str = None) -> list:
+        """Return partition dates (YYYY-MM-DD) within the inclusive range."""
+        if not os.path.isdir(self.root):
+            return []
+        dates = sorted(name[len("date="):] for name in os.listdir(self.root) if name.startswith("date="))
+        return [d for d in dates
+                if (not start_date or d >= start_date) and (not end_date or d <= end_date)]
+
+    def _part_files(self, date: str) -> list:
+        partition_dir = os.path.join(self.root, f"date={date}")
+        return sorted(os.path.join(partition_dir, name) for name in os.listdir(partition_dir)
+                      if name.endswith(".parquet") and not name.startswith("."))
+
+    def query(self, columns: list = None, filters: list = None, group_by: list = None,
+              aggregates: list = None, start_date: str = None, end_date: str = None):
+        """
+        Scan the archive and return a pyarrow Table.
+
+        filters: list of (column, op, value) with op in ==, !=, <, <=, >, >=, in
+        group_by: list of columns to group on
+        aggregates: list of (column, agg) with agg in count, count_distinct, sum, mean, min, max;
+                    result columns are named "<column>_<agg>"
+        columns cannot be combined with group_by or aggregates.
+        start_date / end_date: inclusive YYYY-MM-DD partition range
+        """
+        filters = [tuple(_as_list(f, "filter")) for f in _as_list(filters, "filters")]
+        group_by = _as_list(group_by, "group_by")
+        aggregates = [tuple(_as_list(a, "aggregate")) for a in _as_list(aggregates, "aggregates")]
+        if columns is not None:
+            columns = _as_list(columns, "columns")
+
+        start_date = _as_date(start_date, "start_date")
+        end_date = _as_date(end_date, "end_date")
+        if columns is not None and (group_by or aggregates):
+            raise ValueError("columns cannot be combined with group_by or aggregates")
+
+        if any(len(f) != 3 for f in filters):
+            raise ValueError("Each filter must be [column, op, value]")
+        if any(len(a) != 2 for a in aggregates):
+            raise ValueError("Each aggregate must be [column, agg]")
+
+        referenced = (columns or []) + [c for c, _, _ in filters] + group_by + [c for c, _ in aggregates]
+        unknown = [c for c in referenced if c not in SCHEMA.names]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+
+        # Check operators, values and aggregates against column types up front
+        # so type mismatches are reported as bad requests, not Arrow errors
+        for column, op, value in filters:
+            if op not in FILTER_OPS:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            field_type = SCHEMA.field(column).type
+            try:
+                if op == "in":
+                    pa.array(_as_list(value, "in filter value"), type=field_type)
+                else:
+                    pa.scalar(value, type=field_type)
+            except (pa.ArrowException, TypeError, ValueError):
+                raise ValueError(f"Filter value {value!r} does not match type of column {column}")
+        for column, agg in aggregates:
+            if agg not in AGGREGATES:
+                raise ValueError(f"Unsupported aggregate: {agg}")
+            if agg in NUMERIC_AGGREGATES and not pa.types.is_integer(SCHEMA.field(column).type) \
+                    and not pa.types.is_floating(SCHEMA.field(column).type):
+                raise ValueError(f"Aggregate {agg} needs a numeric column, got {column}")
+
+        needed = list(dict.fromkeys(SCHEMA.names if columns is None and not aggregates else referenced))
+        if columns is None and not aggregates:
+            columns = SCHEMA.names
+
+        tables = []
+        for date in self.partitions(start_date, end_date):
+            with self._partition_lock(date, exclusive=False):
+                tables.extend(pq.read_table(path, columns=needed, memory_map=True)
+                              for path in self._part_files(date))
+        if tables:
+            table = pa.concat_tables(tables)
+        else:
+            table = SCHEMA.empty_table().select(needed)
+
+        if filters:
+            mask = None
+            for column, op, value in filters:
+                condition = FILTER_OPS[op](table[column], value)
+                mask = condition if mask is None else pc.and_(mask, condition)
+            table = table.filter(mask)
+
+        if group_by:
+            return table.group_by(group_by).aggregate([(c, agg) for c, agg in aggregates])
+        if aggregates:
+            return pa.table({f"{c}_{agg}": [getattr(pc, agg)(table[c]).as_py()] for c, agg in aggregates})
+        return table.select(columns)
+
+
+decision_archive = DecisionArchive()
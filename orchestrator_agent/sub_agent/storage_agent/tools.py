@@ -1,10 +1,12 @@
 # from sub_agent.shared.utils import extract_fields, safe_float, clean_int
 # from sub_agent.shared.logger import logger
 
+import asyncio
 import logging
 import os
 from google.cloud import bigquery
 from ..shared.utils import normalize_date
+from .archive import decision_archive
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -15,16 +17,9 @@ TABLE_ID = os.getenv("TABLE_ID")
 
 logger = logging.getLogger("storage_agent")
 
-def save_to_bigquery(payload: dict):
-    print(payload, "payload")
-    """
-    Saves underwriting results to BigQuery.
-    Expects a single payload dictionary containing all required fields.
-    """
-
-    logger.info("Saving underwriting result to BigQuery")
-
-    row = [{
+def build_decision_row(payload: dict) -> dict:
+    """Build the decision table row from an underwriting payload."""
+    return {
         "appicant_name": payload.get("applicant_name", ""),
         "credit_score": payload.get("credit"),
         "loan_amount": payload.get("loan"),
@@ -39,9 +34,31 @@ def save_to_bigquery(payload: dict):
         "dob": normalize_date(payload.get("dob")) if payload.get("dob") else None,
         "decision": payload.get("decision"),
         "timestamp": datetime.utcnow().isoformat()
-    }]
+    }
+
+
+async def save_to_bigquery(payload: dict):
+    print(payload, "payload")
+    """
+    Saves underwriting results to BigQuery and the local decision archive.
+    Expects a single payload dictionary containing all required fields.
+    """
+
+    logger.info("Saving underwriting result to BigQuery")
+
+    row = [build_decision_row(payload)]
+
+    # The local archive is written first so it is kept even when BigQuery is unreachable
+    try:
+        await asyncio.to_thread(decision_archive.append, row)
+    except Exception:
+        logger.exception("❌ Local decision archive write failed")
 
-    errors = bq_client.insert_rows_json(TABLE_ID, row)
+    try:
+        errors = await asyncio.to_thread(bq_client.insert_rows_json, TABLE_ID, row)
+    except Exception:
+        logger.exception("❌ BigQuery insert failed")
+        return
 
     if errors:
         logger.error(f"❌ BigQuery insert failed: {errors}")
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orchestrator_agent"))
+
+from sub_agent.shared import application_store as store_module
+from sub_agent.shared.application_store import ApplicationNotFoundError, ApplicationStore
+
+
+def test_get_returns_saved_entry():
+    store = ApplicationStore()
+    store.save("a", {"tax": "gs://bucket/tax.pdf"}, {"tax": {"tax_income": 1.0}})
+
+    entry = store.get("a")
+
+    assert entry["gcs_uris"] == {"tax": "gs://bucket/tax.pdf"}
+    assert entry["parsed_docs"] == {"tax": {"tax_income": 1.0}}
+
+
+def test_unknown_application_raises():
+    with pytest.raises(ApplicationNotFoundError):
+        ApplicationStore().get("missing")
+
+
+def test_oldest_entries_evicted_beyond_max_size():
+    store = ApplicationStore(max_size=2)
+    for application_id in ["a", "b", "c"]:
+        store.save(application_id, {}, {})
+
+    with pytest.raises(ApplicationNotFoundError):
+        store.get("a")
+    assert store.get("b") and store.get("c")
+
+
+def test_resaving_refreshes_position():
+    store = ApplicationStore(max_size=2)
+    store.save("a", {}, {})
+    store.save("b", {}, {})
+    store.save("a", {}, {})
+    store.save("c", {}, {})
+
+    with pytest.raises(ApplicationNotFoundError):
+        store.get("b")
+    assert store.get("a")
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(store_module.time, "monotonic", lambda: now[0])
+    store = ApplicationStore(ttl=60)
+    store.save("a", {}, {})
+
+    now[0] += 59
+    assert store.get("a")
+    now[0] += 2
+    with pytest.raises(ApplicationNotFoundError):
+        store.get("a")
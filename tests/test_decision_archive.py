@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orchestrator_agent"))
+
+from sub_agent.storage_agent.archive import DecisionArchive
+
+
+def row(credit, dti, decision, timestamp):
+    return {"credit_score": credit, "dti": dti, "decision": decision, "timestamp": timestamp}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = DecisionArchive(str(tmp_path))
+    for i in range(5):
+        archive.append([row(700 + i, 20.0 + i, "Approved", f"2026-10-19T10:00:0{i}")])
+    archive.append([row(550, 50.0, "Denied: Credit too low", "2026-10-18T10:00:00")])
+    return archive
+
+
+def test_compaction_keeps_append_order(archive):
+    archive.compact()
+
+    assert len(archive._part_files("2026-10-19")) == 1
+    rows = archive.query(columns=["credit_score"], start_date="2026-10-19").to_pylist()
+    assert [r["credit_score"] for r in rows] == [700, 701, 702, 703, 704]
+
+
+def test_applicant_pii_is_not_archived(tmp_path):
+    archive = DecisionArchive(str(tmp_path))
+    archive.append([{**row(700, 20.0, "Approved", "2026-10-19T10:00:00"),
+                     "appicant_name": "Alice", "id_number": "X123", "dob": "1990-01-01"}])
+
+    stored = archive.query().column_names
+
+    assert not {"appicant_name", "id_number", "dob"} & set(stored)
+
+
+def test_date_range_selects_partitions(archive):
+    rows = archive.query(columns=["decision"], start_date="2026-10-18", end_date="2026-10-18").to_pylist()
+
+    assert rows == [{"decision": "Denied: Credit too low"}]
+
+
+def test_group_by_aggregate(archive):
+    rows = archive.query(group_by=["decision"], aggregates=[("dti", "mean"), ("decision", "count")])
+
+    assert sorted(rows.to_pylist(), key=lambda r: r["decision"]) == [
+        {"decision": "Approved", "dti_mean": 22.0, "decision_count": 5},
+        {"decision": "Denied: Credit too low", "dti_mean": 50.0, "decision_count": 1},
+    ]
+
+
+@pytest.mark.parametrize("query", [
+    {"aggregates": [("decision", "mean")]},
+    {"filters": [("credit_score", "==", "abc")]},
+    {"filters": [("decision", ">", 5)]},
+    {"filters": [("credit_score", "in", 700)]},
+    {"filters": [5]},
+    {"filters": "credit_score"},
+    {"aggregates": [("dti",)]},
+    {"columns": ["unknown"]},
+    {"columns": ["id_number"]},
+    {"columns": ["credit_score"], "aggregates": [("dti", "mean")]},
+    {"columns": ["credit_score"], "group_by": ["decision"]},
+    {"start_date": 5},
+    {"end_date": "19/10/2026"},
+])
+def test_invalid_queries_raise_value_error(archive, query):
+    with pytest.raises(ValueError):
+        archive.query(**query)
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("google.cloud.documentai_v1")
+pytest.importorskip("google.adk")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orchestrator_agent"))
+
+from sub_agent.doc_parsing_agent import tools as doc_tools
+from sub_agent.shared.application_store import ApplicationNotFoundError
+
+PAYLOAD = {
+    "application_gcs_uri": "application",
+    "bank_statement_gcs_uri": "bank",
+    "pay_stub_gcs_uri": "pay_stub",
+    "tax_return_gcs_uri": "tax",
+    "id_proof_gcs_uri": "id",
+}
+
+
+def doc(**fields):
+    return {"entities": [{"type_": k, "mention_text": v} for k, v in fields.items()]}
+
+
+DOCS = {
+    "application": doc(Credit_score="750", Loan_amount="20000", months="36", Annual_income="60000", Full_Name="Alice"),
+    "bank": doc(salary_deposit="5000", closing_balance="4000"),
+    "pay_stub": doc(net_pay="9000"),
+    "pay_stub_v2": doc(net_pay="5000"),
+    "tax": {"error": "DocAI failed"},
+    "tax_v2": doc(Annual_income="60000"),
+    "id": doc(Full_Name="Alice"),
+}
+
+# The application parses first, then the tax return fails while the rest are in flight
+DELAYS = {"tax": 0.1, "bank": 1, "pay_stub": 1, "id": 1}
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Stub DocAI and record which URIs were actually sent to it."""
+    calls = []
+
+    async def fake_process_single_doc(project_id, location, processor_id, gcs_uri):
+        calls.append(gcs_uri)
+        await asyncio.sleep(DELAYS.get(gcs_uri, 0))
+        return DOCS[gcs_uri]
+
+    monkeypatch.setattr(doc_tools, "process_single_doc", fake_process_single_doc)
+    return calls
+
+
+def test_resubmit_reprocesses_only_replaced_documents(processed):
+    payload = dict(PAYLOAD, tax_return_gcs_uri="tax_v2", application_id="batch")
+    first = asyncio.run(doc_tools.process_and_parse_docs(payload))
+    assert first["net_pay"] == 9000.0
+    processed.clear()
+
+    record = asyncio.run(doc_tools.resubmit_docs({"application_id": "batch", "pay_stub_gcs_uri": "pay_stub_v2"}))
+
+    assert processed == ["pay_stub_v2"]
+    assert record["net_pay"] == 5000.0
+    assert record["credit"] == 750 and record["tax_income"] == 60000.0
+
+
+def test_resubmit_keeps_failed_document_until_replaced(processed):
+    asyncio.run(doc_tools.process_and_parse_docs(dict(PAYLOAD, application_id="failed")))
+    processed.clear()
+
+    record = asyncio.run(doc_tools.resubmit_docs({"application_id": "failed", "pay_stub_gcs_uri": "pay_stub_v2"}))
+
+    assert processed == ["pay_stub_v2"]
+    assert record["document_mismatch"] is True
+
+
+def test_resubmit_after_stream_reprocesses_cancelled_documents(processed):
+    first = asyncio.run(doc_tools.stream_and_parse_docs(dict(PAYLOAD, application_id="stream")))
+    assert first["document_mismatch"] is True
+    processed.clear()
+
+    record = asyncio.run(doc_tools.resubmit_docs({"application_id": "stream", "tax_return_gcs_uri": "tax_v2"}))
+
+    # The application was parsed before the tax return failed; the other three were cancelled
+    assert sorted(processed) == ["bank", "id", "pay_stub", "tax_v2"]
+    assert record["document_mismatch"] is False
+
+
+def test_resubmit_unknown_application_raises(processed):
+    with pytest.raises(ApplicationNotFoundError):
+        asyncio.run(doc_tools.resubmit_docs({"application_id": "missing", "tax_return_gcs_uri": "tax_v2"}))
+    assert processed == []
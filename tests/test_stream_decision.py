@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("google.cloud.documentai_v1")
+pytest.importorskip("google.adk")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orchestrator_agent"))
+
+from sub_agent.doc_parsing_agent import tools as doc_tools
+from sub_agent.rules_agent.tools import loan_approval
+
+PAYLOAD = {
+    "application_gcs_uri": "application",
+    "bank_statement_gcs_uri": "bank",
+    "pay_stub_gcs_uri": "pay_stub",
+    "tax_return_gcs_uri": "tax",
+    "id_proof_gcs_uri": "id",
+}
+
+
+def doc(**fields):
+    return {"entities": [{"type_": k, "mention_text": v} for k, v in fields.items()]}
+
+
+def application(credit="750", name="Alice", annual="60000"):
+    return doc(Credit_score=credit, Loan_amount="20000", months="36", Annual_income=annual, Full_Name=name)
+
+
+def documents(**overrides):
+    docs = {
+        "application": application(),
+        "bank": doc(salary_deposit="5000", closing_balance="4000"),
+        "pay_stub": doc(net_pay="5000"),
+        "tax": doc(Annual_income="60000"),
+        "id": doc(Full_Name="Alice"),
+    }
+    docs.update(overrides)
+    return docs
+
+
+def decide(record):
+    return record["message"] if record.get("document_mismatch") else loan_approval(record)
+
+
+DELAYS = {"application": 0, "pay_stub": 0.01, "bank": 0.02, "tax": 0.03, "id": 0.3}
+OTHER_DOCS = ["bank", "id", "pay_stub", "tax"]
+
+
+@pytest.fixture
+def stub_docai(monkeypatch):
+    """Stub DocAI and return the list of URIs whose calls were cancelled."""
+    cancelled = []
+
+    def install(docs, delays=None):
+        cancelled.clear()
+
+        async def fake_process_single_doc(project_id, location, processor_id, gcs_uri):
+            try:
+                await asyncio.sleep((delays or {}).get(gcs_uri, 0))
+            except asyncio.CancelledError:
+                cancelled.append(gcs_uri)
+                raise
+            return docs[gcs_uri]
+        monkeypatch.setattr(doc_tools, "process_single_doc", fake_process_single_doc)
+        return cancelled
+    return install
+
+
+@pytest.mark.parametrize("docs, decision, cancelled", [
+    (documents(), "Approved", []),
+    (documents(application=application(credit="560"), id=doc(Full_Name="Bob")),
+     "Denied: Credit too low", OTHER_DOCS),
+    (documents(application=application(credit="560")), "Denied: Credit too low", OTHER_DOCS),
+    (documents(application=application(credit="560"), tax=doc(Annual_income="90000")),
+     "Denied: Credit too low", OTHER_DOCS),
+    (documents(application=application(credit="560"), tax={"error": "DocAI failed"}),
+     "Denied: Credit too low", OTHER_DOCS),
+    (documents(application=application(credit="N/A")), "Error: Missing required data", OTHER_DOCS),
+    (documents(pay_stub=doc(net_pay="9000")),
+     "Flagged: Pay Stub Net Pay (9000.0) does not match Bank Income (5000.0)", []),
+    (documents(id=doc(Full_Name="Bob")),
+     "Flagged: ID Proof Name (Bob) does not match Application Form (Alice)", []),
+    (documents(tax={"error": "DocAI failed"}), "Document mismatched or unrecognized document type", ["id"]),
+])
+def test_stream_matches_batch_decision(stub_docai, docs, decision, cancelled):
+    stub_docai(docs, delays=DELAYS)
+    batch = decide(asyncio.run(doc_tools.process_and_parse_docs(dict(PAYLOAD))))
+
+    stream_cancelled = stub_docai(docs, delays=DELAYS)
+    stream = decide(asyncio.run(doc_tools.stream_and_parse_docs(dict(PAYLOAD))))
+
+    assert batch == decision
+    assert stream == decision
+    assert sorted(stream_cancelled) == cancelled
+
+
+def test_stream_cancels_remaining_docs_on_unparseable_document(stub_docai):
+    cancelled = stub_docai(documents(application={"error": "DocAI failed"}),
+                           delays={"bank": 5, "pay_stub": 5, "tax": 5, "id": 5})
+
+    record = asyncio.run(asyncio.wait_for(doc_tools.stream_and_parse_docs(dict(PAYLOAD)), timeout=1))
+
+    assert record["document_mismatch"] is True
+    assert sorted(cancelled) == OTHER_DOCS